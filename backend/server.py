@@ -1,14 +1,27 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request, Response
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import AsyncMongoClient, ReturnDocument
+from bson.binary import Binary
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+import boto3
+from botocore.exceptions import ClientError
+import msgspec
+import asyncio
 import os
+import gzip
 import logging
+from logging.handlers import QueueHandler, QueueListener
+import queue
 from pathlib import Path
+from urllib.parse import quote
 from pydantic import BaseModel, Field
 from typing import List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timezone
 
 
 ROOT_DIR = Path(__file__).parent
@@ -16,15 +29,54 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncMongoClient(
+    mongo_url,
+    maxPoolSize=50,
+    minPoolSize=10,
+    serverSelectionTimeoutMS=2000,
+    connectTimeoutMS=2000
+)
 db = client[os.environ['DB_NAME']]
 
+# Optional S3/MinIO bucket for BPMN XML; without it the XML stays in Mongo
+bpmn_bucket = os.environ.get('BPMN_BUCKET')
+s3_client = (
+    boto3.client('s3', endpoint_url=os.environ.get('S3_ENDPOINT_URL'))
+    if bpmn_bucket else None
+)
+# Leaves documents as undecoded BSON; fields are decoded only when accessed
+raw_bpmn_processes = db.bpmn_processes.with_options(
+    codec_options=CodecOptions(document_class=RawBSONDocument)
+)
+
+_uuid4 = uuid.uuid4
+_utcnow = datetime.utcnow
+
+# Configure logging; records are queued and written to stderr by a
+# background thread so request handlers never block on log I/O. The handler
+# is installed and the thread started by the startup hook, not at import.
+log_queue = queue.SimpleQueue()
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(
+    logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+)
+queue_handler = QueueHandler(log_queue)
+log_listener = QueueListener(log_queue, log_handler)
+logger = logging.getLogger(__name__)
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Upper bound on the ids accepted by one batch lookup on GET /api/processes
+MAX_BATCH_IDS = 1000
+
+# Newest first; _id breaks created_at ties so offset paging never skips or
+# repeats a process. The startup hook builds the matching compound index.
+PROCESS_LIST_ORDER = [("created_at", -1), ("_id", -1)]
+
 
 # Models for BPMN Process Management
 class ProcessBase(BaseModel):
@@ -38,30 +90,211 @@ class ProcessUpdate(ProcessBase):
     bpmn_xml: Optional[str] = None
 
 class Process(ProcessBase):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: _uuid4().hex)
+    bpmn_xml: Optional[str] = None
+    created_at: datetime = Field(default_factory=_utcnow)
+    updated_at: datetime = Field(default_factory=_utcnow)
+
+# List entry; the list view never renders the diagram, so it has no bpmn_xml
+class ProcessSummary(ProcessBase):
+    id: str
+    created_at: datetime
+    updated_at: datetime
+
+# Response-only mirrors of ProcessSummary and Process, encoded with msgspec on
+# the read path
+class ProcessSummaryOut(msgspec.Struct):
+    id: str
+    name: str
+    description: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ProcessOut(ProcessSummaryOut):
     bpmn_xml: Optional[str] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 # Legacy models for status checks
 class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    id: str = Field(default_factory=lambda: _uuid4().hex)
     client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_utcnow)
 
 class StatusCheckCreate(BaseModel):
     client_name: str
 
 
+# BPMN XML is stored gzipped, either in S3/MinIO with only "bpmn_xml_key" kept
+# in Mongo (when BPMN_BUCKET is configured) or inline in "bpmn_xml_gz".
+# Documents written before either existed carry a plain "bpmn_xml" string.
+# Every save gets a fresh object key, so the object a document points at is
+# never overwritten and a failed Mongo write leaves the stored version intact.
+def bpmn_xml_key(process_id: str) -> str:
+    return f"bpmn/{process_id}/{_uuid4().hex}.xml.gz"
+
+async def store_bpmn_xml(process_id: str, bpmn_xml: Optional[str]) -> dict:
+    """Store the XML and return the fields pointing the process document at it"""
+    # An empty diagram is stored as no diagram, so every reader agrees on it
+    if not bpmn_xml:
+        return {"bpmn_xml_gz": None, "bpmn_xml_key": None, "bpmn_xml_size": None}
+    compressed = gzip.compress(bpmn_xml.encode("utf-8"), compresslevel=6)
+    if s3_client is None:
+        return {"bpmn_xml_gz": Binary(compressed), "bpmn_xml_key": None, "bpmn_xml_size": len(bpmn_xml)}
+    key = bpmn_xml_key(process_id)
+    await run_in_threadpool(
+        s3_client.put_object,
+        Bucket=bpmn_bucket,
+        Key=key,
+        Body=compressed,
+        ContentType="application/xml",
+        ContentEncoding="gzip"
+    )
+    return {"bpmn_xml_gz": None, "bpmn_xml_key": key, "bpmn_xml_size": len(bpmn_xml)}
+
+async def delete_bpmn_xml(key: Optional[str]) -> None:
+    """Best-effort removal of a stored XML object that nothing points at any more"""
+    if key is None or s3_client is None:
+        return
+    try:
+        await run_in_threadpool(s3_client.delete_object, Bucket=bpmn_bucket, Key=key)
+    except Exception as e:
+        logger.warning("Failed to delete BPMN XML object %s: %s", key, e)
+
+async def get_bpmn_object(process_id: str, key: str):
+    """Fetch the stored XML object a process points at.
+
+    A concurrent save deletes the object it replaced, so a reader holding the
+    old key can find it gone. The document is then read once more and its
+    current object fetched instead. Returns the object (None if the process no
+    longer has XML) and the re-read document, or None if no retry was needed.
+    """
+    try:
+        return await run_in_threadpool(s3_client.get_object, Bucket=bpmn_bucket, Key=key), None
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            raise
+        missing = e
+    current = await db.bpmn_processes.find_one(
+        {"id": process_id},
+        projection={"_id": 0, "bpmn_xml": 0, "bpmn_xml_gz": 0}
+    )
+    if current is None:
+        raise HTTPException(status_code=404, detail="Process not found")
+    current_key = current.get("bpmn_xml_key")
+    if current_key is None:
+        return None, current
+    if current_key == key:
+        # Nothing replaced it; the object really is missing
+        raise missing
+    return await run_in_threadpool(s3_client.get_object, Bucket=bpmn_bucket, Key=current_key), current
+
+async def load_bpmn_xml(process: dict) -> dict:
+    """Replace the storage fields of a process document with its bpmn_xml"""
+    key = process.pop("bpmn_xml_key", None)
+    process.pop("bpmn_xml_size", None)
+    compressed = process.pop("bpmn_xml_gz", None)
+    if key is not None:
+        stored, current = await get_bpmn_object(process["id"], key)
+        if current is not None:
+            # Answer with the version that replaced the one we started from
+            process.update(current)
+            process.pop("bpmn_xml_key", None)
+            process.pop("bpmn_xml_size", None)
+        if stored is not None:
+            compressed = await run_in_threadpool(stored["Body"].read)
+    if compressed is not None:
+        process["bpmn_xml"] = gzip.decompress(compressed).decode("utf-8")
+    return process
+
+# Where a document keeps its XML; only legacy documents carry "bpmn_xml"
+STORED_XML_PROJECTION = {"bpmn_xml_gz": 1, "bpmn_xml_key": 1, "bpmn_xml": 1}
+
+async def backfill_bpmn_xml_size() -> None:
+    """Record bpmn_xml_size on legacy documents so metadata reads can skip the XML"""
+    result = await db.bpmn_processes.update_many(
+        {"bpmn_xml": {"$type": "string"}, "bpmn_xml_size": {"$exists": False}},
+        [{"$set": {"bpmn_xml_size": {"$strLenCP": "$bpmn_xml"}}}]
+    )
+    if result.modified_count:
+        logger.info("Recorded bpmn_xml_size on %d legacy processes", result.modified_count)
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Whether an Accept-Encoding header allows a gzip-encoded response"""
+    if not accept_encoding:
+        return False
+    qualities = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+    for coding in ("gzip", "x-gzip"):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return qualities.get("*", 0) > 0
+
+def attachment_disposition(filename: str) -> str:
+    """Content-Disposition with an ASCII fallback and the RFC 5987 UTF-8 form"""
+    fallback = "".join(
+        char if " " <= char <= "~" and char not in '"\\/' else "_" for char in filename
+    )
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+# updated_at changes on every write, so it identifies the stored XML version
+def process_etag(updated_at: datetime) -> str:
+    millis = int(updated_at.replace(tzinfo=timezone.utc).timestamp() * 1000)
+    return f'W/"{millis}"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
 # BPMN Process endpoints
-@api_router.get("/processes", response_model=List[Process])
-async def get_processes():
-    """Get all BPMN processes"""
+@api_router.get("/processes", response_model=List[ProcessSummary])
+async def get_processes(
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    ids: Optional[str] = Query(None, description="Comma-separated process ids to fetch")
+):
+    """Get a page of BPMN processes, newest first, or the processes with the given ids"""
+    if ids is not None:
+        id_list = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+        if not id_list:
+            raise HTTPException(status_code=422, detail="ids must name at least one process")
+        if len(id_list) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=422, detail=f"ids may name at most {MAX_BATCH_IDS} processes")
     try:
-        processes = await db.bpmn_processes.find().to_list(1000)
-        return [Process(**process) for process in processes]
+        # The list view never renders the diagram, so leave the XML behind
+        projection = {"bpmn_xml": 0, "bpmn_xml_gz": 0, "bpmn_xml_key": 0, "bpmn_xml_size": 0}
+        if ids is not None:
+            # Fetch a batch of ids in one round trip rather than one find_one each;
+            # the batch is bounded by its own size, not by limit/offset
+            cursor = db.bpmn_processes.find({"id": {"$in": id_list}}, projection=projection).sort(PROCESS_LIST_ORDER)
+            processes = await cursor.to_list(length=len(id_list))
+        else:
+            cursor = (
+                db.bpmn_processes.find({}, projection=projection)
+                .sort(PROCESS_LIST_ORDER)
+                .skip(offset)
+                .limit(limit)
+            )
+            processes = await cursor.to_list(length=limit)
+        # Documents were validated on write, so skip Pydantic entirely on read
+        return Response(
+            content=msgspec.json.encode(msgspec.convert(processes, List[ProcessSummaryOut])),
+            media_type="application/json"
+        )
     except Exception as e:
-        logger.error(f"Error fetching processes: {e}")
+        logger.error("Error fetching processes: %s", e)
         raise HTTPException(status_code=500, detail="Failed to fetch processes")
 
 @api_router.get("/processes/{process_id}", response_model=Process)
@@ -71,91 +304,197 @@ async def get_process(process_id: str):
         process = await db.bpmn_processes.find_one({"id": process_id})
         if not process:
             raise HTTPException(status_code=404, detail="Process not found")
-        return Process(**process)
+        await load_bpmn_xml(process)
+        return Response(
+            content=msgspec.json.encode(msgspec.convert(process, ProcessOut)),
+            media_type="application/json"
+        )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching process {process_id}: {e}")
+        logger.error("Error fetching process %s: %s", process_id, e)
         raise HTTPException(status_code=500, detail="Failed to fetch process")
 
 @api_router.post("/processes", response_model=Process)
 async def create_process(input: ProcessCreate):
     """Create a new BPMN process"""
     try:
-        process_dict = input.dict()
-        process_obj = Process(**process_dict)
-        await db.bpmn_processes.insert_one(process_obj.dict())
-        logger.info(f"Created new process: {process_obj.id}")
+        now = _utcnow()
+        process_id = _uuid4().hex
+        process_doc = {
+            "id": process_id,
+            "name": input.name,
+            "description": input.description,
+            "created_at": now,
+            "updated_at": now,
+            **await store_bpmn_xml(process_id, input.bpmn_xml),
+        }
+        # Echo what was stored: an empty diagram was stored as none
+        process_obj = Process.model_construct(**process_doc, bpmn_xml=input.bpmn_xml or None)
+        try:
+            await db.bpmn_processes.insert_one(process_doc)
+        except Exception:
+            await delete_bpmn_xml(process_doc["bpmn_xml_key"])
+            raise
+        logger.info("Created new process: %s", process_obj.id)
         return process_obj
     except Exception as e:
-        logger.error(f"Error creating process: {e}")
+        logger.error("Error creating process: %s", e)
         raise HTTPException(status_code=500, detail="Failed to create process")
 
 @api_router.put("/processes/{process_id}", response_model=Process)
 async def update_process(process_id: str, input: ProcessUpdate):
     """Update an existing BPMN process"""
     try:
-        # Check if process exists
-        existing_process = await db.bpmn_processes.find_one({"id": process_id})
-        if not existing_process:
-            raise HTTPException(status_code=404, detail="Process not found")
-        
-        # Update process
-        update_data = input.dict(exclude_unset=True)
-        update_data["updated_at"] = datetime.utcnow()
+        # Only touch the optional fields the client actually sent
+        fields_set = input.model_fields_set
+        update_data = {"name": input.name, "updated_at": _utcnow()}
+        if "description" in fields_set:
+            update_data["description"] = input.description
+        update = {"$set": update_data}
+        if "bpmn_xml" in fields_set:
+            update_data.update(await store_bpmn_xml(process_id, input.bpmn_xml))
+            update["$unset"] = {"bpmn_xml": ""}
         
-        await db.bpmn_processes.update_one(
-            {"id": process_id},
-            {"$set": update_data}
-        )
+        # Update in a single round trip. The previous version is returned so a
+        # replaced XML object can be cleaned up; the new one is rebuilt from it.
+        try:
+            previous_process = await db.bpmn_processes.find_one_and_update(
+                {"id": process_id},
+                update,
+                return_document=ReturnDocument.BEFORE
+            )
+        except Exception:
+            await delete_bpmn_xml(update_data.get("bpmn_xml_key"))
+            raise
+        if not previous_process:
+            await delete_bpmn_xml(update_data.get("bpmn_xml_key"))
+            raise HTTPException(status_code=404, detail="Process not found")
         
-        # Return updated process
-        updated_process = await db.bpmn_processes.find_one({"id": process_id})
-        logger.info(f"Updated process: {process_id}")
-        return Process(**updated_process)
+        logger.info("Updated process: %s", process_id)
+        updated_process = {**previous_process, **update_data}
+        if "bpmn_xml" in fields_set:
+            await delete_bpmn_xml(previous_process.get("bpmn_xml_key"))
+            # We already hold the XML that was just stored; don't read it back
+            updated_process["bpmn_xml"] = input.bpmn_xml or None
+        else:
+            await load_bpmn_xml(updated_process)
+        return Process.model_construct(**updated_process)
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error updating process {process_id}: {e}")
+        logger.error("Error updating process %s: %s", process_id, e)
         raise HTTPException(status_code=500, detail="Failed to update process")
 
 @api_router.delete("/processes/{process_id}")
 async def delete_process(process_id: str):
     """Delete a BPMN process"""
     try:
-        result = await db.bpmn_processes.delete_one({"id": process_id})
-        if result.deleted_count == 0:
+        deleted_process = await db.bpmn_processes.find_one_and_delete(
+            {"id": process_id},
+            projection={"bpmn_xml_key": 1, "_id": 0}
+        )
+        if deleted_process is None:
             raise HTTPException(status_code=404, detail="Process not found")
         
-        logger.info(f"Deleted process: {process_id}")
+        await delete_bpmn_xml(deleted_process.get("bpmn_xml_key"))
+        logger.info("Deleted process: %s", process_id)
         return {"message": "Process deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error deleting process {process_id}: {e}")
+        logger.error("Error deleting process %s: %s", process_id, e)
         raise HTTPException(status_code=500, detail="Failed to delete process")
 
-@api_router.get("/processes/{process_id}/export")
-async def export_process_bpmn(process_id: str):
+@api_router.api_route("/processes/{process_id}/export", methods=["GET", "HEAD"])
+async def export_process_bpmn(process_id: str, request: Request):
     """Export BPMN XML for a specific process"""
     try:
-        process = await db.bpmn_processes.find_one({"id": process_id})
-        if not process:
+        # Revalidation and HEAD only need the metadata; a plain GET fetches the
+        # stored XML in the same query. Every document, legacy ones included
+        # (see backfill_bpmn_xml_size), records bpmn_xml_size.
+        if_none_match = request.headers.get("if-none-match")
+        is_head = request.method == "HEAD"
+        projection = {"name": 1, "updated_at": 1, "bpmn_xml_size": 1, "_id": 0}
+        if not (is_head or if_none_match):
+            projection.update(STORED_XML_PROJECTION)
+        process = await raw_bpmn_processes.find_one({"id": process_id}, projection=projection)
+        if process is None:
             raise HTTPException(status_code=404, detail="Process not found")
         
-        if not process.get("bpmn_xml"):
+        headers = {
+            "ETag": process_etag(process["updated_at"]),
+            "Vary": "Accept-Encoding"
+        }
+        if if_none_match and etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        
+        if not process.get("bpmn_xml_size"):
             raise HTTPException(status_code=404, detail="No BPMN XML found for this process")
         
-        from fastapi.responses import Response
+        headers["Content-Disposition"] = attachment_disposition(f"{process['name']}.bpmn")
+        send_gzip = accepts_gzip(request.headers.get("accept-encoding"))
+        
+        if is_head:
+            if send_gzip:
+                headers["Content-Encoding"] = "gzip"
+            response = Response(media_type="application/xml", headers=headers)
+            # The body is never read, so don't advertise a length of 0
+            del response.headers["content-length"]
+            return response
+        
+        if if_none_match:
+            process = await raw_bpmn_processes.find_one(
+                {"id": process_id},
+                projection={**STORED_XML_PROJECTION, "_id": 0}
+            )
+            if process is None:
+                raise HTTPException(status_code=404, detail="Process not found")
+        
+        key = process.get("bpmn_xml_key")
+        compressed = process.get("bpmn_xml_gz")
+        if key is not None:
+            stored, current = await get_bpmn_object(process_id, key)
+            if current is not None:
+                # A concurrent save replaced the XML; describe the version we send
+                headers["ETag"] = process_etag(current["updated_at"])
+                headers["Content-Disposition"] = attachment_disposition(f"{current['name']}.bpmn")
+            if stored is None:
+                raise HTTPException(status_code=404, detail="No BPMN XML found for this process")
+            if send_gzip:
+                # Stream the stored gzip object straight through to the client
+                headers["Content-Encoding"] = "gzip"
+                headers["Content-Length"] = str(stored["ContentLength"])
+                return StreamingResponse(
+                    stored["Body"].iter_chunks(),
+                    media_type="application/xml",
+                    headers=headers
+                )
+            compressed = await run_in_threadpool(stored["Body"].read)
+        
+        if compressed is not None:
+            # Pass the stored gzip bytes through untouched when the client accepts them
+            if send_gzip:
+                headers["Content-Encoding"] = "gzip"
+                content = compressed
+            else:
+                content = gzip.decompress(compressed)
+        else:
+            # Legacy plain XML; compress it so the response matches HEAD
+            content = process.get("bpmn_xml")
+            if send_gzip:
+                headers["Content-Encoding"] = "gzip"
+                content = gzip.compress(content.encode("utf-8"), compresslevel=6)
+        
         return Response(
-            content=process["bpmn_xml"],
+            content=content,
             media_type="application/xml",
-            headers={"Content-Disposition": f"attachment; filename={process['name']}.bpmn"}
+            headers=headers
         )
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error exporting process {process_id}: {e}")
+        logger.error("Error exporting process %s: %s", process_id, e)
         raise HTTPException(status_code=500, detail="Failed to export process")
 
 
@@ -166,15 +505,16 @@ async def root():
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
+    status_dict = input.model_dump()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await db.status_checks.insert_one(status_obj.model_dump())
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
 async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+    status_checks = await db.status_checks.find({}, projection={"_id": 0}).to_list(1000)
+    # Hand the raw documents straight to orjson instead of building a model per item
+    return ORJSONResponse(content=status_checks)
 
 
 # Include the router in the main app
@@ -188,13 +528,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+@app.on_event("startup")
+async def start_log_listener():
+    root_logger = logging.getLogger()
+    root_logger.setLevel(logging.INFO)
+    root_logger.addHandler(queue_handler)
+    log_listener.start()
+
+@app.on_event("startup")
+async def startup_db_client():
+    # Open the pool up front so the first request doesn't pay for the handshake
+    await db.command("ping")
+
+    # Every lookup filters on our own "id" field rather than Mongo's _id.
+    # The index builds and the legacy backfill are independent, so issue
+    # them concurrently.
+    await asyncio.gather(
+        db.bpmn_processes.create_index("id", unique=True),
+        db.bpmn_processes.create_index(PROCESS_LIST_ORDER),
+        db.status_checks.create_index("id", unique=True),
+        backfill_bpmn_xml_size()
+    )
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await client.close()
+
+@app.on_event("shutdown")
+async def stop_log_listener():
+    # Flush anything still queued; the next startup starts a fresh thread
+    log_listener.stop()
+    logging.getLogger().removeHandler(queue_handler)
\ No newline at end of file
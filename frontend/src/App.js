@@ -7,15 +7,32 @@ import './App.css';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
+const PAGE_SIZE = 50;
 
 function App() {
   const [processes, setProcesses] = useState([]);
   const [currentProcess, setCurrentProcess] = useState(null);
+  const [hasMore, setHasMore] = useState(false);
 
   const fetchProcesses = async () => {
     try {
-      const response = await axios.get(`${API}/processes`);
+      const response = await axios.get(`${API}/processes`, {
+        params: { limit: PAGE_SIZE, offset: 0 }
+      });
       setProcesses(response.data);
+      setHasMore(response.data.length === PAGE_SIZE);
+    } catch (error) {
+      console.error('Error fetching processes:', error);
+    }
+  };
+
+  const loadMoreProcesses = async () => {
+    try {
+      const response = await axios.get(`${API}/processes`, {
+        params: { limit: PAGE_SIZE, offset: processes.length }
+      });
+      setProcesses((loaded) => [...loaded, ...response.data]);
+      setHasMore(response.data.length === PAGE_SIZE);
     } catch (error) {
       console.error('Error fetching processes:', error);
     }
@@ -25,6 +42,16 @@ function App() {
     fetchProcesses();
   }, []);
 
+  const selectProcess = async (process) => {
+    // The list endpoint omits bpmn_xml, so load the full process before editing
+    try {
+      const response = await axios.get(`${API}/processes/${process.id}`);
+      setCurrentProcess(response.data);
+    } catch (error) {
+      console.error('Error fetching process:', error);
+    }
+  };
+
   const createNewProcess = () => {
     const newProcess = {
       id: Date.now().toString(),
@@ -76,7 +103,9 @@ function App() {
             <ProcessList 
               processes={processes} 
               onRefresh={fetchProcesses}
-              onSelectProcess={setCurrentProcess}
+              onSelectProcess={selectProcess}
+              hasMore={hasMore}
+              onLoadMore={loadMoreProcesses}
             />
           } />
           <Route path="/editor/:id?" element={
@@ -4,8 +4,9 @@ import axios from 'axios';
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 const API = `${BACKEND_URL}/api`;
 
-const ProcessList = ({ processes, onRefresh, onSelectProcess }) => {
+const ProcessList = ({ processes, onRefresh, onSelectProcess, hasMore, onLoadMore }) => {
   const [deleting, setDeleting] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [searchTerm, setSearchTerm] = useState('');
 
   const deleteProcess = async (processId) => {
@@ -23,6 +24,15 @@ const ProcessList = ({ processes, onRefresh, onSelectProcess }) => {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      await onLoadMore();
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('en-US', {
       year: 'numeric',
@@ -139,6 +149,19 @@ const ProcessList = ({ processes, onRefresh, onSelectProcess }) => {
           ))}
         </div>
       )}
+
+      {/* Load More */}
+      {hasMore && (
+        <div className="mt-8 text-center">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="bg-white hover:bg-gray-50 text-gray-700 border border-gray-300 px-6 py-2 rounded-lg text-sm font-medium transition-colors shadow-sm disabled:opacity-50"
+          >
+            {loadingMore ? 'Loading...' : 'Load more processes'}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
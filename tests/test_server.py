@@ -0,0 +1,535 @@
+"""
+Unit tests for the BPMN backend helpers and the export endpoint.
+MongoDB is replaced with an in-memory collection, so no server is needed.
+"""
+
+import asyncio
+import gzip
+import io
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from botocore.exceptions import ClientError
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import server  # noqa: E402
+
+
+SAMPLE_BPMN_XML = '<?xml version="1.0" encoding="UTF-8"?><bpmn:definitions id="Definitions_1"/>'
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+        self.skipped = 0
+        self.limited = None
+
+    def sort(self, keys):
+        # Stable sorts from the last key to the first give a compound order
+        for field, direction in reversed(keys):
+            self.docs = sorted(self.docs, key=lambda d: d[field], reverse=direction < 0)
+        return self
+
+    def skip(self, count):
+        self.skipped = count
+        return self
+
+    def limit(self, count):
+        self.limited = count
+        return self
+
+    async def to_list(self, length):
+        docs = self.docs[self.skipped:]
+        return docs[:min(n for n in (length, self.limited) if n is not None)]
+
+
+class FakeCollection:
+    """Just enough of an async collection for the process endpoints"""
+
+    def __init__(self, docs, fail_writes=False):
+        self.docs = docs
+        self.fail_writes = fail_writes
+        self.projections = []
+        self.indexes = []
+        self.updates = []
+
+    def _find(self, query):
+        return next((d for d in self.docs if d["id"] == query["id"]), None)
+
+    def find(self, query, projection=None):
+        wanted = query.get("id", {}).get("$in")
+        docs = [d for d in self.docs if wanted is None or d["id"] in wanted]
+        return FakeCursor([{k: v for k, v in d.items() if k not in projection} for d in docs])
+
+    async def find_one(self, query, projection=None):
+        self.projections.append(projection)
+        doc = self._find(query)
+        if doc is None or projection is None:
+            return doc and dict(doc)
+        if any(v for k, v in projection.items() if k != "_id"):
+            return {k: v for k, v in doc.items() if projection.get(k)}
+        return {k: v for k, v in doc.items() if projection.get(k, 1)}
+
+    async def insert_one(self, doc):
+        if self.fail_writes:
+            raise RuntimeError("write failed")
+        self.docs.append(doc)
+
+    async def find_one_and_update(self, query, update, return_document):
+        if self.fail_writes:
+            raise RuntimeError("write failed")
+        doc = self._find(query)
+        if doc is None:
+            return None
+        previous = dict(doc)
+        doc.update(update.get("$set", {}))
+        for field in update.get("$unset", {}):
+            doc.pop(field, None)
+        return previous
+
+    async def update_many(self, query, update):
+        self.updates.append((query, update))
+        return SimpleNamespace(modified_count=0)
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append(keys)
+        return keys
+
+    async def find_one_and_delete(self, query, projection=None):
+        doc = self._find(query)
+        if doc is not None:
+            self.docs.remove(doc)
+        return doc
+
+
+class FakeS3:
+    """In-memory stand-in for the boto3 S3 client"""
+
+    def __init__(self):
+        self.objects = {}
+        self.gets = []
+        # Called before the next get_object, e.g. to race a concurrent save
+        self.before_get = None
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        if self.before_get is not None:
+            before_get, self.before_get = self.before_get, None
+            before_get()
+        self.gets.append(Key)
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        body = self.objects[Key]
+        return {"Body": io.BytesIO(body), "ContentLength": len(body)}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+
+class FakeDatabase(SimpleNamespace):
+    async def command(self, name):
+        return {"ok": 1}
+
+
+class FakeClient:
+    async def close(self):
+        pass
+
+
+@pytest.fixture(autouse=True)
+def inline_storage(monkeypatch):
+    # Keep XML in the document even if BPMN_BUCKET is set in the environment
+    monkeypatch.setattr(server, "s3_client", None)
+
+
+@pytest.fixture
+def s3_storage(monkeypatch):
+    s3 = FakeS3()
+    monkeypatch.setattr(server, "s3_client", s3)
+    monkeypatch.setattr(server, "bpmn_bucket", "bpmn-test")
+    return s3
+
+
+@pytest.fixture
+def api_client(monkeypatch):
+    """Build a client whose regular and raw process collections share documents"""
+    def make(*docs, fail_writes=False):
+        collection = FakeCollection(list(docs), fail_writes=fail_writes)
+        monkeypatch.setattr(server, "db", FakeDatabase(bpmn_processes=collection))
+        monkeypatch.setattr(server, "raw_bpmn_processes", collection)
+        # No context manager: the startup hook would try to reach MongoDB
+        return TestClient(server.app), collection
+    return make
+
+
+def stored_process(**overrides):
+    """A process document whose XML went through the active storage backend"""
+    fields = asyncio.run(server.store_bpmn_xml("p1", SAMPLE_BPMN_XML))
+    return {"id": "p1", "name": "Order", "updated_at": server._utcnow(), **fields, **overrides}
+
+
+# Storage round trip
+def test_store_and_load_bpmn_xml_round_trip():
+    fields = asyncio.run(server.store_bpmn_xml("p1", SAMPLE_BPMN_XML))
+    assert gzip.decompress(fields["bpmn_xml_gz"]) == SAMPLE_BPMN_XML.encode("utf-8")
+
+    process = asyncio.run(server.load_bpmn_xml({"id": "p1", **fields}))
+    assert process == {"id": "p1", "bpmn_xml": SAMPLE_BPMN_XML}
+
+@pytest.mark.parametrize("bpmn_xml", [None, ""])
+def test_store_bpmn_xml_keeps_nothing_for_missing_or_empty_xml(bpmn_xml):
+    fields = asyncio.run(server.store_bpmn_xml("p1", bpmn_xml))
+    assert all(value is None for value in fields.values())
+
+def test_create_with_empty_xml_echoes_null(api_client):
+    client, collection = api_client()
+    response = client.post("/api/processes", json={"name": "Blank", "bpmn_xml": ""})
+    assert response.status_code == 200
+    assert response.json()["bpmn_xml"] is None
+    assert collection.docs[0]["bpmn_xml_gz"] is None
+
+def test_update_with_empty_xml_echoes_null(api_client):
+    client, _ = api_client(stored_process())
+    response = client.put("/api/processes/p1", json={"name": "Order", "bpmn_xml": ""})
+    assert response.status_code == 200
+    assert response.json()["bpmn_xml"] is None
+
+def test_load_bpmn_xml_reads_legacy_plain_documents():
+    process = asyncio.run(server.load_bpmn_xml({"id": "p1", "bpmn_xml": SAMPLE_BPMN_XML}))
+    assert process["bpmn_xml"] == SAMPLE_BPMN_XML
+
+
+# Object storage
+def test_store_bpmn_xml_records_uncompressed_length(s3_storage):
+    fields = asyncio.run(server.store_bpmn_xml("p1", SAMPLE_BPMN_XML))
+    assert fields["bpmn_xml_size"] == len(SAMPLE_BPMN_XML)
+    assert list(s3_storage.objects) == [fields["bpmn_xml_key"]]
+
+def test_update_switches_to_a_new_object_and_removes_the_old_one(api_client, s3_storage):
+    process = stored_process()
+    old_key = process["bpmn_xml_key"]
+    client, collection = api_client(process)
+    response = client.put("/api/processes/p1", json={"name": "Order", "bpmn_xml": "<new/>"})
+    assert response.status_code == 200
+    assert response.json()["bpmn_xml"] == "<new/>"
+
+    new_key = collection.docs[0]["bpmn_xml_key"]
+    assert new_key != old_key
+    assert list(s3_storage.objects) == [new_key]
+    assert gzip.decompress(s3_storage.objects[new_key]) == b"<new/>"
+
+def test_update_to_null_xml_removes_the_object(api_client, s3_storage):
+    process = stored_process()
+    client, collection = api_client(process)
+    response = client.put("/api/processes/p1", json={"name": "Order", "bpmn_xml": None})
+    assert response.status_code == 200
+    assert collection.docs[0]["bpmn_xml_key"] is None
+    assert s3_storage.objects == {}
+
+def test_failed_update_keeps_the_stored_version(api_client, s3_storage):
+    process = stored_process()
+    old_key = process["bpmn_xml_key"]
+    client, collection = api_client(process, fail_writes=True)
+    response = client.put("/api/processes/p1", json={"name": "Order", "bpmn_xml": "<new/>"})
+    assert response.status_code == 500
+    assert list(s3_storage.objects) == [old_key]
+    assert gzip.decompress(s3_storage.objects[old_key]) == SAMPLE_BPMN_XML.encode("utf-8")
+
+def test_update_of_missing_process_leaves_no_object(api_client, s3_storage):
+    client, _ = api_client()
+    response = client.put("/api/processes/nope", json={"name": "Ghost", "bpmn_xml": "<g/>"})
+    assert response.status_code == 404
+    assert s3_storage.objects == {}
+
+def test_delete_removes_the_object(api_client, s3_storage):
+    client, _ = api_client(stored_process())
+    assert client.delete("/api/processes/p1").status_code == 200
+    assert s3_storage.objects == {}
+
+def race_concurrent_update(client, s3_storage, bpmn_xml):
+    """Save new XML after the reader has fetched the document but before it reads the object"""
+    s3_storage.before_get = lambda: client.put(
+        "/api/processes/p1", json={"name": "Renamed", "bpmn_xml": bpmn_xml}
+    )
+
+def test_export_follows_an_object_replaced_by_a_concurrent_update(api_client, s3_storage):
+    process = stored_process()
+    old_key = process["bpmn_xml_key"]
+    client, collection = api_client(process)
+    race_concurrent_update(client, s3_storage, "<new/>")
+    response = client.get("/api/processes/p1/export", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == b"<new/>"
+    assert response.headers["etag"] == server.process_etag(collection.docs[0]["updated_at"])
+    assert "Renamed.bpmn" in response.headers["content-disposition"]
+    assert s3_storage.gets == [old_key, collection.docs[0]["bpmn_xml_key"]]
+
+def test_export_is_404_when_a_concurrent_update_cleared_the_xml(api_client, s3_storage):
+    client, _ = api_client(stored_process())
+    race_concurrent_update(client, s3_storage, None)
+    assert client.get("/api/processes/p1/export").status_code == 404
+
+def test_get_process_follows_an_object_replaced_by_a_concurrent_update(api_client, s3_storage):
+    client, _ = api_client(stored_process())
+    race_concurrent_update(client, s3_storage, "<new/>")
+    response = client.get("/api/processes/p1")
+    assert response.status_code == 200
+    assert response.json()["name"] == "Renamed"
+    assert response.json()["bpmn_xml"] == "<new/>"
+
+def test_export_of_a_lost_object_is_still_an_error(api_client, s3_storage):
+    client, _ = api_client(stored_process())
+    s3_storage.objects.clear()
+    assert client.get("/api/processes/p1/export").status_code == 500
+
+
+# Accept-Encoding negotiation
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("deflate, GZIP;q=0.5", True),
+    ("x-gzip", True),
+    ("gzip;q=0, identity", False),
+    ("gzip; q=0.0", False),
+    ("identity", False),
+    ("*", True),
+    ("*;q=0", False),
+    ("gzip;q=0, *", False),
+    ("br, *;q=0.1", True),
+    ("gzip;q=bogus", False),
+])
+def test_accepts_gzip(header, expected):
+    assert server.accepts_gzip(header) is expected
+
+def test_export_sends_stored_gzip_to_accepting_clients(api_client):
+    client, _ = api_client(stored_process())
+    response = client.get("/api/processes/p1/export", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.text == SAMPLE_BPMN_XML
+
+def test_export_decompresses_when_gzip_is_refused(api_client):
+    client, _ = api_client(stored_process())
+    response = client.get(
+        "/api/processes/p1/export",
+        headers={"Accept-Encoding": "gzip;q=0, identity"}
+    )
+    assert response.status_code == 200
+    assert "content-encoding" not in response.headers
+    assert response.text == SAMPLE_BPMN_XML
+
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_export_without_xml_is_404_for_every_encoding(api_client, accept_encoding):
+    client, _ = api_client(
+        {"id": "p1", "name": "Empty", "updated_at": server._utcnow(), "bpmn_xml": ""}
+    )
+    response = client.get(
+        "/api/processes/p1/export",
+        headers={"Accept-Encoding": accept_encoding}
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"] == "No BPMN XML found for this process"
+
+
+# Conditional export
+def test_process_etag_is_weak_and_in_milliseconds():
+    assert server.process_etag(datetime(2024, 1, 2, 3, 4, 5, 678000)) == 'W/"1704164645678"'
+
+@pytest.mark.parametrize("if_none_match, expected", [
+    ('W/"1"', True),
+    ('"1"', True),
+    ('"2", W/"1"', True),
+    ('  W/"1"  ', True),
+    ("*", True),
+    ('"2"', False),
+    ('W/"12"', False),
+])
+def test_etag_matches(if_none_match, expected):
+    assert server.etag_matches(if_none_match, 'W/"1"') is expected
+
+def test_export_revalidation_returns_304_with_the_200_headers(api_client):
+    process = stored_process()
+    client, collection = api_client(process)
+    first = client.get("/api/processes/p1/export")
+    response = client.get(
+        "/api/processes/p1/export",
+        headers={"If-None-Match": first.headers["etag"]}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == first.headers["etag"]
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert not {"bpmn_xml_gz", "bpmn_xml"} & set(collection.projections[-1])
+
+def test_export_with_stale_etag_sends_the_xml(api_client):
+    client, _ = api_client(stored_process())
+    response = client.get("/api/processes/p1/export", headers={"If-None-Match": 'W/"0"'})
+    assert response.status_code == 200
+    assert response.text == SAMPLE_BPMN_XML
+
+def test_export_head_reads_only_metadata(api_client, s3_storage):
+    process = stored_process()
+    client, collection = api_client(process)
+    response = client.head("/api/processes/p1/export", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.content == b""
+    assert response.headers["etag"] == server.process_etag(process["updated_at"])
+    assert response.headers["content-encoding"] == "gzip"
+    assert "content-length" not in response.headers
+    assert s3_storage.gets == []
+    assert not {"bpmn_xml_gz", "bpmn_xml_key", "bpmn_xml"} & set(collection.projections[-1])
+
+def legacy_process():
+    """A document saved before gzip storage, after the bpmn_xml_size backfill"""
+    return {
+        "id": "p1",
+        "name": "Order",
+        "updated_at": server._utcnow(),
+        "bpmn_xml": SAMPLE_BPMN_XML,
+        "bpmn_xml_size": len(SAMPLE_BPMN_XML),
+    }
+
+def test_export_head_of_legacy_process_matches_the_get(api_client):
+    client, collection = api_client(legacy_process())
+    head = client.head("/api/processes/p1/export", headers={"Accept-Encoding": "gzip"})
+    assert "bpmn_xml" not in collection.projections[-1]
+    get = client.get("/api/processes/p1/export", headers={"Accept-Encoding": "gzip"})
+    assert head.status_code == get.status_code == 200
+    assert head.headers["content-encoding"] == get.headers["content-encoding"] == "gzip"
+    assert get.text == SAMPLE_BPMN_XML
+
+def test_export_of_legacy_process_to_identity_clients(api_client):
+    client, _ = api_client(legacy_process())
+    response = client.get("/api/processes/p1/export", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    assert response.text == SAMPLE_BPMN_XML
+
+def test_startup_backfills_bpmn_xml_size_on_legacy_documents(api_client):
+    _, collection = api_client()
+    server.db.status_checks = FakeCollection([])
+    asyncio.run(server.startup_db_client())
+    [(query, update)] = collection.updates
+    assert query == {"bpmn_xml": {"$type": "string"}, "bpmn_xml_size": {"$exists": False}}
+    assert update == [{"$set": {"bpmn_xml_size": {"$strLenCP": "$bpmn_xml"}}}]
+
+def test_export_head_without_xml_is_404(api_client):
+    client, _ = api_client(
+        {"id": "p1", "name": "Empty", "updated_at": server._utcnow(), "bpmn_xml_size": None}
+    )
+    assert client.head("/api/processes/p1/export").status_code == 404
+
+
+# Download filename
+def test_attachment_disposition_escapes_slashes_and_quotes():
+    assert server.attachment_disposition('My proc/ä"x.bpmn') == (
+        'attachment; filename="My proc___x.bpmn"; '
+        "filename*=UTF-8''My%20proc%2F%C3%A4%22x.bpmn"
+    )
+
+def test_attachment_disposition_keeps_plain_names():
+    assert server.attachment_disposition("Order v2.bpmn") == (
+        "attachment; filename=\"Order v2.bpmn\"; filename*=UTF-8''Order%20v2.bpmn"
+    )
+
+def test_export_sets_attachment_filename(api_client):
+    process = stored_process()
+    client, _ = api_client({**process, "name": "Ordre/Ü"})
+    response = client.get("/api/processes/p1/export")
+    assert response.headers["content-disposition"] == (
+        "attachment; filename=\"Ordre__.bpmn\"; filename*=UTF-8''Ordre%2F%C3%9C.bpmn"
+    )
+
+
+# Process list
+def make_processes(count):
+    return [
+        {"_id": n, "id": f"p{n}", "name": f"Process {n}", "created_at": datetime(2024, 1, 1, 0, 0, n % 60, n)}
+        for n in range(count)
+    ]
+
+def test_list_is_paginated(api_client):
+    client, _ = api_client(*make_processes(60))
+    first = client.get("/api/processes").json()
+    rest = client.get("/api/processes", params={"offset": 50}).json()
+    assert len(first) == 50
+    assert len(rest) == 10
+    assert not {p["id"] for p in first} & {p["id"] for p in rest}
+
+def test_list_items_have_no_bpmn_xml(api_client):
+    client, _ = api_client(*make_processes(2))
+    assert all("bpmn_xml" not in p for p in client.get("/api/processes").json())
+
+def test_list_schema_does_not_advertise_bpmn_xml(api_client):
+    client, _ = api_client()
+    schema = client.get("/openapi.json").json()
+    response = schema["paths"]["/api/processes"]["get"]["responses"]["200"]
+    item_ref = response["content"]["application/json"]["schema"]["items"]["$ref"]
+    item = schema["components"]["schemas"][item_ref.rsplit("/", 1)[-1]]
+    assert "bpmn_xml" not in item["properties"]
+
+def test_pages_do_not_overlap_when_created_at_ties(api_client):
+    created_at = datetime(2024, 1, 1)
+    docs = [{"_id": n, "id": f"p{n}", "name": f"Process {n}", "created_at": created_at} for n in (3, 1, 4, 0, 2)]
+    client, _ = api_client(*docs)
+    pages = [
+        client.get("/api/processes", params={"limit": 2, "offset": offset}).json()
+        for offset in (0, 2, 4)
+    ]
+    assert [p["id"] for page in pages for p in page] == ["p4", "p3", "p2", "p1", "p0"]
+
+def test_startup_indexes_the_list_order(api_client):
+    _, collection = api_client()
+    server.db.status_checks = FakeCollection([])
+    asyncio.run(server.startup_db_client())
+    assert server.PROCESS_LIST_ORDER in collection.indexes
+
+def test_id_batch_is_not_cut_to_the_page_size(api_client):
+    client, _ = api_client(*make_processes(70))
+    ids = ",".join(f"p{n}" for n in range(60))
+    response = client.get("/api/processes", params={"ids": ids, "limit": 5, "offset": 3})
+    assert response.status_code == 200
+    assert {p["id"] for p in response.json()} == {f"p{n}" for n in range(60)}
+
+@pytest.mark.parametrize("ids", ["", ",", " , "])
+def test_empty_id_batch_is_rejected(api_client, ids):
+    client, _ = api_client()
+    assert client.get("/api/processes", params={"ids": ids}).status_code == 422
+
+def test_oversized_id_batch_is_rejected(api_client):
+    client, _ = api_client()
+    ids = ",".join(f"p{n}" for n in range(server.MAX_BATCH_IDS + 1))
+    assert client.get("/api/processes", params={"ids": ids}).status_code == 422
+
+
+# Logging lifecycle
+def test_import_leaves_the_root_logger_alone():
+    assert server.queue_handler not in logging.getLogger().handlers
+
+def test_logs_are_written_across_repeated_lifespans(monkeypatch):
+    monkeypatch.setattr(server, "client", FakeClient())
+    monkeypatch.setattr(server, "db", FakeDatabase(
+        bpmn_processes=FakeCollection([]),
+        status_checks=FakeCollection([])
+    ))
+    stream = io.StringIO()
+    previous_stream = server.log_handler.setStream(stream)
+    try:
+        for cycle in range(2):
+            with TestClient(server.app):
+                server.logger.info("lifespan cycle %s", cycle)
+            assert server.queue_handler not in logging.getLogger().handlers
+    finally:
+        server.log_handler.setStream(previous_stream)
+    assert "lifespan cycle 0" in stream.getvalue()
+    assert "lifespan cycle 1" in stream.getvalue()